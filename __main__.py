@@ -1,72 +1,165 @@
 """This is the main python file for running the entirety of this multinational data centralisation project. It takes instances of the
 DatabaseConnector, DataExtractor, and DataCleaning classes to extract data from the numerous relevant sources, clean each of the
-obtained datasets in turn, and then upload all of them to a postgresql database. 
+obtained datasets in turn, and then upload all of them to a postgresql database. Every stage is recorded in the run_ledger, and
+running with --resume carries on from the last failed run, skipping the stages that already completed.
 
 It contains the following functions:
     * extract_user_data - Uses the database_connector object to connect to an Amazon RDS database instance, then the data_extractor to
-      save the user data as a csv file 
+      save the user data as a csv file
     * extract_card_data - Uses the data_extractor object to download a pdf and collate the card data from all of its pages into a csv file
     * extract_stores_data - Uses the data_extractor object to get data from each store from their respective API endpoints
       and collate it all into a csv file
     * extract_product_data - Uses the data_extractor object to connect to an AWS S3 bucket and download the product data into a csv file
     * extract_orders_data - Works the same as extract_user_data but for downloading the orders data instead
     * extract_events_data - Works the same as extract_product_data but for downloading a json file of events (when each sale happened)
-    * clean_and_upload_datasets - Cleans every dataset in turn and uploads them to separate tables in a postgresql database
+    * convert_product_weights - Standardises the product weights into a csv file which is then cleaned like the other datasets
+    * clean_dataset - Cleans a single dataset and saves it in cleaned_data/ ready to be uploaded. Cleaned datasets are cached by the
+      data_cache object so unchanged inputs are not cleaned again on later runs
+    * upload_datasets - Uploads every cleaned dataset that hasn't been uploaded yet concurrently to separate tables in a postgresql database,
+      recording how long each table took in the run ledger
+    * run_pipeline - Runs each of the above as a separate stage recorded in the run ledger
 """
 
-from database_utils import database_connector # Constructor automatically runs methods to read database credentials and initialise a SQLAlchemy database engine
+from database_utils import database_connector # Reads database credentials and initialises SQLAlchemy database engines when they are first needed
 from data_extraction import data_extractor
 from data_cleaning import data_cleaning
+from data_caching import data_cache # Cache of cleaned dataframes, run data_caching.py directly to list or invalidate entries
+from run_ledger import run_ledger # Records the status, output and row count of each stage in a local SQLite file
+from functools import partial
+import argparse
+import os
+import pandas as pd
 
 
 def extract_user_data():
     database_connector.list_db_tables() # Shows the tables in the database
     user_details_df = data_extractor.read_rds_table(database_connector, 'legacy_users') # Reads user details table and saves as dataframe
     user_details_df.to_csv('extracted_data/user_details.csv') # Save as csv for easier handling and troubleshooting
+    return len(user_details_df)
 
 def extract_card_data():
     # Use retrieve pdf data function to download pdf, concatenate tables across pages and store in a dataframe
     card_details_df = data_extractor.retrieve_pdf_data('https://data-handling-public.s3.eu-west-1.amazonaws.com/card_details.pdf', 'extracted_data/card_details.pdf')
-    card_details_df.to_csv('extracted_data/card_details.csv') 
+    card_details_df.to_csv('extracted_data/card_details.csv')
+    return len(card_details_df)
 
 def extract_stores_data():
     # Retrieves the number of stores using an API, then use that to retrieve the store details from the respective endpoint for each store
     number_of_stores = data_extractor.list_number_of_stores('https://aqj7u5id95.execute-api.eu-west-1.amazonaws.com/prod/number_stores')
     store_details_df = data_extractor.retrieve_stores_data('https://aqj7u5id95.execute-api.eu-west-1.amazonaws.com/prod/store_details/', number_of_stores)
-    store_details_df.to_csv('extracted_data/store_details.csv') 
+    store_details_df.to_csv('extracted_data/store_details.csv')
+    return len(store_details_df)
 
 def extract_product_data():
     data_extractor.extract_from_s3('s3://data-handling-public/products.csv', 'extracted_data/product_details.csv')
-    # Function already downloads a csv file so just use this for data cleaning 
+    # Function already downloads a csv file so just use this for data cleaning, it is only read here for the row count
+    return len(pd.read_csv('extracted_data/product_details.csv'))
 
 def extract_orders_data():
     order_details_df = data_extractor.read_rds_table(database_connector, 'orders_table')
-    order_details_df.to_csv('extracted_data/order_details.csv') 
+    order_details_df.to_csv('extracted_data/order_details.csv')
+    return len(order_details_df)
 
 def extract_events_data():
-    events_data_json = data_extractor.extract_from_s3('s3://data-handling-public/date_details.json', 'extracted_data/event_details.json')
-    # Function already downloads a json that pandas can read so just use this for data cleaning
-
-def clean_and_upload_datasets():
-    cleaned_user_data_df = data_cleaning.clean_user_data('extracted_data/user_details.csv')
-    cleaned_card_data_df = data_cleaning.clean_card_data('extracted_data/card_details.csv')
-    cleaned_store_data_df = data_cleaning.clean_store_data('extracted_data/store_details.csv')
-    products_data_weights_converted_df = data_cleaning.convert_product_weights('extracted_data/product_details.csv')
-    cleaned_products_data_df = data_cleaning.clean_products_data('extracted_data/product_details_weights_converted.csv') # Function above creates file
-    cleaned_orders_data_df = data_cleaning.clean_orders_data('extracted_data/order_details.csv')
-    cleaned_events_data_df = data_cleaning.clean_events_data('extracted_data/event_details.json')
-
-    database_connector.upload_to_db(df=cleaned_user_data_df, table_name='dim_users')  
-    database_connector.upload_to_db(df=cleaned_card_data_df, table_name='dim_card_details')
-    database_connector.upload_to_db(df=cleaned_store_data_df, table_name='dim_store_details')
-    database_connector.upload_to_db(df=cleaned_products_data_df, table_name='dim_products')
-    database_connector.upload_to_db(df=cleaned_orders_data_df, table_name = 'orders_table')
-    database_connector.upload_to_db(df=cleaned_events_data_df, table_name = 'dim_date_times')
-
-extract_user_data()
-extract_card_data()
-extract_stores_data()
-extract_product_data()
-extract_orders_data()
-extract_events_data()
-clean_and_upload_datasets()
+    data_extractor.extract_from_s3('s3://data-handling-public/date_details.json', 'extracted_data/event_details.json')
+    # Function already downloads a json that pandas can read so just use this for data cleaning, it is only read here for the row count
+    return len(pd.read_json('extracted_data/event_details.json'))
+
+# Extraction stage, function and the file it creates for each dataset
+extraction_stages = [
+    ('extract_user_data', extract_user_data, 'extracted_data/user_details.csv'),
+    ('extract_card_data', extract_card_data, 'extracted_data/card_details.csv'),
+    ('extract_stores_data', extract_stores_data, 'extracted_data/store_details.csv'),
+    ('extract_product_data', extract_product_data, 'extracted_data/product_details.csv'),
+    ('extract_orders_data', extract_orders_data, 'extracted_data/order_details.csv'),
+    ('extract_events_data', extract_events_data, 'extracted_data/event_details.json'),
+]
+
+# Table name, cleaning method, input file and the stage that creates the input file for each dataset
+cleaning_stages = [
+    ('dim_users', data_cleaning.clean_user_data, 'extracted_data/user_details.csv', 'extract_user_data'),
+    ('dim_card_details', data_cleaning.clean_card_data, 'extracted_data/card_details.csv', 'extract_card_data'),
+    ('dim_store_details', data_cleaning.clean_store_data, 'extracted_data/store_details.csv', 'extract_stores_data'),
+    ('dim_products', data_cleaning.clean_products_data, 'extracted_data/product_details_weights_converted.csv', 'convert_product_weights'),
+    ('orders_table', data_cleaning.clean_orders_data, 'extracted_data/order_details.csv', 'extract_orders_data'),
+    ('dim_date_times', data_cleaning.clean_events_data, 'extracted_data/event_details.json', 'extract_events_data'),
+]
+
+def cleaned_data_path(table_name):
+    return f'cleaned_data/{table_name}.pkl'
+
+def convert_product_weights():
+    products_data_weights_converted_df = data_cache.load_or_clean(data_cleaning.convert_product_weights, 'extracted_data/product_details.csv')
+    # The method writes this file itself but a cache hit doesn't, so it is always rewritten from the frame to make sure
+    # clean_products_data reads the weights for this input rather than one left over from an earlier run
+    products_data_weights_converted_df.to_csv('extracted_data/product_details_weights_converted.csv')
+    return len(products_data_weights_converted_df)
+
+def clean_dataset(table_name, cleaning_method, file):
+    # Each dataset is only cleaned again if its input file or cleaning method has changed since it was last cached
+    cleaned_df = data_cache.load_or_clean(cleaning_method, file)
+    # Saved so a resumed run can upload it without cleaning it again
+    os.makedirs('cleaned_data', exist_ok=True)
+    cleaned_df.to_pickle(cleaned_data_path(table_name))
+    return len(cleaned_df)
+
+def upload_datasets(enforce_fk_order=False):
+    # Tables are uploaded concurrently, each in its own transaction, so a failed table leaves nothing behind and can just be
+    # uploaded again on resume. to_sql creates each table itself, so there are no foreign key constraints while uploading
+    # (creating_database_schema.sql adds them afterwards) and the order doesn't matter. enforce_fk_order=True is only needed
+    # when appending (if_exists='append') to tables that already exist with foreign key constraints, so that the dimension
+    # tables are loaded before orders_table
+    tables = {}
+    for table_name, _, _, _ in cleaning_stages:
+        if run_ledger.is_completed(f'upload_{table_name}', depends_on=(f'clean_{table_name}',)):
+            print(f"Skipping upload_{table_name}, already completed in run {run_ledger.run_id}")
+        else:
+            tables[table_name] = pd.read_pickle(cleaned_data_path(table_name))
+    if not tables:
+        return {}
+
+    # A table this run has already uploaded (or may have, if it stopped before recording the upload) has to be replaced when its
+    # upload is run again because an earlier stage was, otherwise to_sql fails as the table already exists
+    if_exists = {}
+    for table_name in tables:
+        if run_ledger.was_completed(f'upload_{table_name}') or run_ledger.stage_status(f'upload_{table_name}') == 'running':
+            if_exists[table_name] = 'replace'
+        run_ledger.start_stage(f'upload_{table_name}')
+    uploaded = set()
+    def on_uploaded(table_name, elapsed):
+        uploaded.add(table_name)
+        # The time the upload itself took rather than since start_stage, which includes waiting for a free connection
+        run_ledger.complete_stage(f'upload_{table_name}', f'table:{table_name}', len(tables[table_name]), elapsed)
+    try:
+        timings = database_connector.upload_tables(tables, enforce_fk_order=enforce_fk_order, on_uploaded=on_uploaded, if_exists=if_exists)
+    except Exception as e:
+        for table_name in tables:
+            if table_name not in uploaded:
+                run_ledger.fail_stage(f'upload_{table_name}', e)
+        raise
+    return timings
+
+def run_pipeline(resume=False):
+    run_ledger.start_run(resume=resume)
+    try:
+        for stage, extract_function, extracted_file in extraction_stages:
+            run_ledger.run_stage(stage, extract_function, artefact=extracted_file)
+        run_ledger.run_stage('convert_product_weights', convert_product_weights, artefact='extracted_data/product_details_weights_converted.csv',
+                             depends_on=('extract_product_data',))
+        for table_name, cleaning_method, file, input_stage in cleaning_stages:
+            run_ledger.run_stage(f'clean_{table_name}', partial(clean_dataset, table_name, cleaning_method, file),
+                                 artefact=cleaned_data_path(table_name), depends_on=(input_stage,))
+        upload_datasets()
+    except Exception:
+        run_ledger.finish_run('failed')
+        run_ledger.print_run()
+        print("\nPipeline run failed, fix the error above and run again with --resume to carry on from the failed stage")
+        raise
+    run_ledger.finish_run('completed')
+    run_ledger.print_run()
+
+if __name__ == "__main__": # Always true when run as a script, but lets the stages be imported by the tests
+    parser = argparse.ArgumentParser(description="Extract, clean and upload the retail datasets to the sales_data database")
+    parser.add_argument('--resume', action='store_true', help="carry on from the last failed run, skipping stages that already completed")
+    args = parser.parse_args()
+    run_pipeline(resume=args.resume)
@@ -0,0 +1,118 @@
+"""This script benchmarks the string fixes stage of DataCleaning.clean_user_data (the country code, email address and phone
+number fixes) on a large user extract, comparing the original separate passes with the fused single pass per column that
+replaced them, and the pyarrow string backend that was considered instead.
+
+The extract is built by resampling extracted_data/user_details.csv up to the requested number of rows. Each variant is
+run in its own process so that memory is measured independently: the stage time is measured after the csv has been read,
+and the peak RSS of the stage is measured by resetting the process high water mark (VmHWM) after the read, which needs
+Linux. Each variant is run several times, interleaved with the others, and the median is reported. Run it from the
+root of the repository:
+
+    python benchmarks/benchmark_user_string_fixes.py --rows 3000000
+"""
+
+import argparse
+import gc
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+
+# The benchmark is run from the root of the repository but lives in benchmarks/, so the repository root is added to the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_cleaning import data_cleaning
+
+string_columns = ['country_code', 'email_address', 'phone_number']
+
+def original(df):
+    # String fixes as they were before being fused, each one a separate pass over its column
+    df['country_code'] = df['country_code'].str.replace('GGB', 'GB')
+    df['email_address'] = df['email_address'].str.replace('@@', '@')
+    df['phone_number'] = df['phone_number'].str.replace('(0)', '')
+    df['phone_number'] = df['phone_number'].apply(lambda x: re.sub(r'[^\dx+]', '', x))
+    return df
+
+def fused(df):
+    # String fixes as they are in clean_user_data, a single vectorised regex pass per column
+    return data_cleaning.fix_user_strings(df)
+
+def fused_arrow(df):
+    # Same as fused but converting each column to the pyarrow string backend first
+    for column in string_columns:
+        df[column] = df[column].astype('string[pyarrow]')
+    return data_cleaning.fix_user_strings(df)
+
+variants = {'original': original, 'fused': fused, 'fused_arrow': fused_arrow}
+
+def read_status(key):
+    """
+    This function is used to read a memory figure (in MiB) for the current process from /proc/self/status.
+
+    Args:
+            key (str): Field to read, e.g. VmRSS or VmHWM
+    Returns:
+            value (float): Value of the field in MiB
+    """
+    with open('/proc/self/status') as file:
+        for line in file:
+            if line.startswith(key):
+                return int(line.split()[1]) / 1024
+
+def run_variant(variant, extract_file):
+    """
+    This function is used to time a single variant of the string fixes stage and measure its peak memory, then check
+    that its output is identical to the original implementation.
+
+    Args:
+            variant (str): Name of the variant to run
+            extract_file (str): File path of the large user extract
+    """
+    df = pd.read_csv(extract_file).dropna().reset_index(drop=True)
+    gc.collect()
+    with open('/proc/self/clear_refs', 'w') as file:
+        file.write('5') # Resets VmHWM to the current RSS so the peak of the stage alone is measured
+    start_rss = read_status('VmRSS')
+    start = time.perf_counter()
+    fixed_df = variants[variant](df)
+    elapsed = time.perf_counter() - start
+    peak_rss = read_status('VmHWM') - start_rss
+    print(f"{variant:12s} rows={len(fixed_df)} stage_time={elapsed:.2f}s peak_rss=+{peak_rss:.0f}MiB", end='')
+    if variant != 'original':
+        expected_df = original(pd.read_csv(extract_file).dropna().reset_index(drop=True))
+        print(f" identical={all((fixed_df[column].astype(object) == expected_df[column]).all() for column in string_columns)}")
+    else:
+        print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the string fixes stage of clean_user_data")
+    parser.add_argument('--rows', type=int, default=3_000_000, help="number of rows in the resampled user extract")
+    parser.add_argument('--repeat', type=int, default=5, help="number of times each variant is run, the median is reported")
+    parser.add_argument('--variant', choices=variants, help="run a single variant on an existing extract (used internally)")
+    parser.add_argument('--extract-file', help="file path of an existing extract (used internally)")
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.extract_file)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            extract_file = os.path.join(temp_dir, 'big_user_details.csv')
+            user_details_df = pd.read_csv('extracted_data/user_details.csv')
+            user_details_df.sample(args.rows, replace=True, random_state=0).to_csv(extract_file, index=False)
+            print(f"Resampled extracted_data/user_details.csv to {args.rows} rows")
+            results = {}
+            for repeat in range(args.repeat):
+                # Variants are interleaved so that any drift in the speed of the machine affects them all equally
+                for variant in variants:
+                    output = subprocess.run([sys.executable, __file__, '--variant', variant, '--extract-file', extract_file],
+                                            check=True, capture_output=True, text=True).stdout.strip()
+                    print(output)
+                    times = re.search(r'stage_time=([\d.]+)s peak_rss=\+(\d+)MiB', output)
+                    results.setdefault(variant, []).append((float(times[1]), int(times[2])))
+            print(f"\nMedian of {args.repeat} runs at {args.rows} rows:")
+            for variant, runs in results.items():
+                print(f"{variant:12s} stage_time={statistics.median(time for time, _ in runs):.2f}s "
+                      f"peak_rss=+{statistics.median(rss for _, rss in runs):.0f}MiB")
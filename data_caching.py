@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import pandas as pd
+
+
+class DataCache():
+    """
+    This class is used to keep a persistent cache of the cleaned dataframes returned by the methods of the
+    DataCleaning class, so that a dataset is only cleaned again when something that affects the result has
+    changed. Each cached dataframe is stored as a parquet file named after a key built from the contents of
+    the input file, the source code of the cleaning method and the configuration it was called with.
+
+    Attributes:
+            cache_dir (str): Directory the cached parquet files are stored in
+            max_size_bytes (int): Total size the cache directory is allowed to grow to before the least
+            recently used files are evicted
+    """
+    def __init__(self, cache_dir='cleaned_data_cache', max_size_bytes=500 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+
+    def hash_file(self, file):
+        """
+        This function is used to hash the contents of an input file in chunks so that large extracts don't
+        have to be read into memory at once.
+
+        Args:
+                file (str): The file path of the dataset to be hashed
+        Returns:
+                file_hash (str): Hex digest of the file contents
+        """
+        file_hash = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                file_hash.update(chunk)
+        return file_hash.hexdigest()
+
+    def hash_method_source(self, method):
+        """
+        This function is used to hash the source code of a cleaning method. The source of the class constructor
+        (where the shared regex patterns are defined) and of any other methods of the class that the cleaning
+        method calls are included too, so that a change to any of them invalidates the cached output.
+
+        Args:
+                method (method): Bound method of the data_cleaning object
+        Returns:
+                source_hash (str): Hex digest of the relevant source code
+        """
+        cls = type(method.__self__)
+        source_hash = hashlib.sha256(inspect.getsource(method).encode())
+        source_hash.update(inspect.getsource(cls.__init__).encode())
+        for name in sorted(set(method.__code__.co_names)):
+            attribute = getattr(cls, name, None)
+            if inspect.isfunction(attribute) and name != method.__name__:
+                source_hash.update(inspect.getsource(attribute).encode())
+        return source_hash.hexdigest()
+
+    def make_key(self, method, file, config=None):
+        """
+        This function is used to build the cache key for a call to a cleaning method from the input file hash,
+        the method source hash and the configuration (any keyword arguments plus the pandas version, since
+        different versions of pandas can clean the same data differently).
+
+        Args:
+                method (method): Bound method of the data_cleaning object
+                file (str): The file path of the dataset to be cleaned
+                config (dict): Keyword arguments passed to the cleaning method
+        Returns:
+                key (str): Cache key, prefixed with the method name so entries can be invalidated per method
+        """
+        config = {'kwargs': config or {}, 'pandas_version': pd.__version__}
+        key_hash = hashlib.sha256()
+        key_hash.update(self.hash_file(file).encode())
+        key_hash.update(self.hash_method_source(method).encode())
+        key_hash.update(json.dumps(config, sort_keys=True, default=str).encode())
+        return f"{method.__name__}-{key_hash.hexdigest()[:32]}"
+
+    def load_or_clean(self, method, file, **kwargs):
+        """
+        This function is used in place of calling a cleaning method directly. If a cached dataframe exists for
+        the same input file, method source and configuration it is loaded from parquet, otherwise the method is
+        run and its output is written to the cache. A cached file that can't be read is replaced with the new output.
+        Any other problem reading or writing the cache is printed and the method is simply run as normal, so the
+        cache can never stop the pipeline from working.
+
+        Args:
+                method (method): Bound method of the data_cleaning object
+                file (str): The file path of the dataset to be cleaned
+                **kwargs: Keyword arguments passed on to the cleaning method
+        Returns:
+                df (pandas.DataFrame): Dataframe of cleaned data
+        """
+        try:
+            key = self.make_key(method, file, kwargs)
+            cache_path = os.path.join(self.cache_dir, f"{key}.parquet")
+            if os.path.exists(cache_path):
+                try:
+                    df = pd.read_parquet(cache_path)
+                except Exception as e:
+                    # A damaged entry is removed so that the freshly cleaned dataframe is written in its place
+                    print(f"Could not read cached data for {file}, cleaning it again: {e}")
+                    os.remove(cache_path)
+                else:
+                    os.utime(cache_path) # Mark as recently used for eviction
+                    print(f"Loaded cleaned data for {file} from cache ({method.__name__} unchanged)")
+                    return df
+        except Exception as e:
+            print(f"Could not read from cache, cleaning {file} instead: {e}")
+            cache_path = None
+
+        df = method(file, **kwargs)
+
+        if cache_path is not None:
+            temp_path = None
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # Written to a temporary file first and then moved into place, so an interrupted write can never
+                # leave a partly written entry behind to be read by a later run
+                fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=self.cache_dir)
+                os.close(fd)
+                df.to_parquet(temp_path)
+                os.replace(temp_path, cache_path)
+                self.evict()
+            except Exception as e:
+                print(f"Could not write cleaned data for {file} to cache: {e}")
+            finally:
+                if temp_path is not None and os.path.exists(temp_path):
+                    os.remove(temp_path)
+        return df
+
+    def list_entries(self):
+        """
+        This function is used to list the files in the cache, with the least recently used first.
+
+        Returns:
+                entries (list): List of (file path, size in bytes, last used timestamp) tuples
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith('.parquet'):
+                path = os.path.join(self.cache_dir, file_name)
+                stat = os.stat(path)
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """
+        This function is used to delete the least recently used files in the cache until its total size is
+        within max_size_bytes.
+        """
+        entries = self.list_entries()
+        total_size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total_size <= self.max_size_bytes:
+                break
+            os.remove(path)
+            total_size -= size
+            print(f"Evicted {path} from cache")
+
+    def invalidate(self, method_name=None):
+        """
+        This function is used to delete cached dataframes, either for a single cleaning method or for all of them.
+
+        Args:
+                method_name (str): Name of the cleaning method to invalidate, or None to clear the whole cache
+        Returns:
+                removed (int): Number of cached files deleted
+        """
+        removed = 0
+        for path, _, _ in self.list_entries():
+            if method_name is None or os.path.basename(path).startswith(f"{method_name}-"):
+                os.remove(path)
+                removed += 1
+        print(f"Removed {removed} cached file(s) from {self.cache_dir}")
+        return removed
+
+data_cache = DataCache()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or invalidate the cache of cleaned datasets")
+    parser.add_argument('--list', action='store_true', help="list cached files, least recently used first")
+    parser.add_argument('--invalidate', metavar='METHOD', help="remove cached output of one cleaning method, e.g. clean_user_data")
+    parser.add_argument('--clear', action='store_true', help="remove every cached file")
+    parser.add_argument('--max-size-mb', type=float, help="evict least recently used files until the cache fits in this size")
+    args = parser.parse_args()
+
+    if args.clear:
+        data_cache.invalidate()
+    elif args.invalidate:
+        data_cache.invalidate(args.invalidate)
+    if args.max_size_mb is not None:
+        data_cache.max_size_bytes = int(args.max_size_mb * 1024 * 1024)
+        data_cache.evict()
+    if args.list or not (args.clear or args.invalidate or args.max_size_mb is not None):
+        for path, size, last_used in data_cache.list_entries():
+            print(f"{path}\t{size / 1024:.1f} KB\tlast used {pd.Timestamp(last_used, unit='s'):%Y-%m-%d %H:%M:%S}")
@@ -61,9 +61,10 @@ class DataCleaning():
         for column in df:
             xprint(df[column].value_counts())
 
-        # Looking at categorical columns showed there are clearly records with garbled values
-        # Also showed that some country codes written as GGB instead of GB
-        df['country_code']= df['country_code'].str.replace('GGB', 'GB') # GGB corrected
+        # Fix the country codes, email addresses and phone numbers shown to need it by the checks in this method
+        df = self.fix_user_strings(df)
+
+        # Looking at categorical columns also showed there are clearly records with garbled values
         xprint('\nGarbled records:\n', df[df['country_code'].str.len() != 2]) # Looking at invalid records (all country codes should be 2)
         # All of those records were evidently completely invalid across the board so are dropped
         df = df[df['country_code'].str.len() == 2].reset_index(drop=True)
@@ -74,10 +75,9 @@ class DataCleaning():
 
         # Check for invalid first and last names, only ones shown contain fullstops and are not invalid so no action taken
         xprint('\nRegex nonconforming names:\n', df[['first_name', 'last_name', 'address']][~(df['first_name'].str.match(name_pattern) | ~df['last_name'].str.match(name_pattern))])    
-        # Check for invalid email addresses
+        # Check for invalid email addresses. Before the string fixes above nearly all of those shown had double @'s, now the only
+        # one shown contains an umlaut, which is a valid character so no action taken
         xprint('\nRegex nonconforming email addresses:\n', df['email_address'][~df['email_address'].str.match(email_pattern)])
-        # All email addresses shown have double @'s which are corrected
-        df['email_address'] = df['email_address'].str.replace('@@','@')
         # Check for invalid uuids shows none
         xprint('\nRegex nonconforming uuids:\n', df['user_uuid'][~df['user_uuid'].str.match(self.uuid_pattern)])
 
@@ -94,13 +94,31 @@ class DataCleaning():
         df['join_date'] = df['join_date'].apply(parse)
         xprint('\nParsed join dates:\n',df.iloc[bad_jd_indices]['join_date'])
 
-        # Too many variations of phone numbers for sensible validation, but worth standardising
-        # Cleaned by removing "(0)"s then stripping non-digit characters except 'x' and leading '+'
-        df['phone_number'] = df['phone_number'].str.replace('(0)', '')
-        df['phone_number'] = df['phone_number'].apply(lambda x: re.sub(r'[^\dx+]', '', x))
-
         print("User data successfully cleaned")
         return df
+
+    def fix_user_strings(self, df):
+        """
+        This function is used by clean_user_data to fix the string columns of the user details dataset. All of
+        the fixes are applied together, with a single vectorised regex pass per column, rather than in separate
+        passes which each allocate a new column of strings. This lowers peak memory on large extracts, although
+        it takes about the same time (see benchmarks/benchmark_user_string_fixes.py).
+
+        Args:
+                df (pandas.DataFrame): Dataframe of user data
+        Returns:
+                df (pandas.DataFrame): Dataframe of user data with fixed country codes, email addresses and phone numbers
+        """
+        string_fixes = {
+            'country_code': ('GGB', 'GB'), # Looking at categorical columns showed some country codes written as GGB instead of GB
+            'email_address': ('@@', '@'), # Some email addresses have double @'s (shown by the email address check in clean_user_data)
+            # Too many variations of phone numbers for sensible validation, but worth standardising
+            # Cleaned by removing "(0)"s and stripping non-digit characters except 'x' and leading '+'
+            'phone_number': (r'\(0\)|[^\dx+]', ''),
+        }
+        for column, (pattern, replacement) in string_fixes.items():
+            df[column] = df[column].str.replace(pattern, replacement, regex=True)
+        return df
     
     def clean_card_data(self, file):
         """
@@ -12,11 +12,25 @@ class DataExtractor():
     a pandas dataframe.
 
     Attributes:
-            api_header (dict): API key for authentication
+            api_header (dict): API key for authentication, read the first time one of the store API methods is used
     """    
     def __init__(self):
-        with open('api_key.json') as json_data:
-            self.api_header = json.load(json_data)
+        self.api_header = None
+
+    def read_api_key(self, filename='api_key.json'):
+        """
+        This function is used to read the API key needed for the store API endpoints. It is only read when the
+        stores data is extracted, so the other stages don't depend on the file being there.
+
+        Args:
+                filename (str): The json file to read the API key from
+        Returns:
+                api_header (dict): API key for authentication
+        """
+        if self.api_header is None:
+            with open(filename) as json_data:
+                self.api_header = json.load(json_data)
+        return self.api_header
             
     def read_rds_table(self, database_connector, table_name):
         """
@@ -31,12 +45,12 @@ class DataExtractor():
         """               
         try:
             query = f"SELECT * FROM {table_name}"
-            df = pd.read_sql(query, database_connector.engine)
+            df = pd.read_sql(query, database_connector.init_db_engine())
             print(f"RDS table {table_name} succesfully read from database")
             return df
         except Exception as e:
             print(f"An error occurred while reading the RDS table: {e}")
-            return None
+            raise
     
     def retrieve_pdf_data(self, pdf_link, pdf_local_name):
         """
@@ -53,6 +67,7 @@ class DataExtractor():
         """        
         try:
             response = requests.get(pdf_link)
+            response.raise_for_status()
             with open(f'{pdf_local_name}', 'wb') as file:
                 file.write(response.content)
             print(f"{pdf_local_name} successfully downloaded")    
@@ -73,15 +88,15 @@ class DataExtractor():
         
         except requests.RequestException as re:
             print(f"RequestException: {re}")
-            return None
+            raise
         
         except tabula.errors.JavaNotFoundError as je:
             print(f"JavaNotFoundError: {je}")
-            return None
+            raise
        
         except Exception as e:
             print(f"An error occurred: {e}")
-            return None
+            raise
         
     def list_number_of_stores(self, endpoint_url):
         """
@@ -90,14 +105,16 @@ class DataExtractor():
                 end_point_url(str): API endpoint for information on number of stores
         Returns:
                 mumber_of_stores(int): Number of stores value from json response
+        Raises:
+                requests.HTTPError: If the API does not respond successfully
         """        
-        response = requests.get(endpoint_url, headers=self.api_header)
+        response = requests.get(endpoint_url, headers=self.read_api_key())
         if response.status_code == 200: # Successful response
             number_of_stores = response.json().get('number_stores')
             print(f"Successfully connected to API endpoint. Number of stores is {number_of_stores}")
         else:
             print(f"Error: Failed to retrieve data. Status code: {response.status_code}")
-            number_of_stores = None
+            raise requests.HTTPError(f"Failed to retrieve number of stores, status code {response.status_code}", response=response)
         return number_of_stores
    
     def retrieve_stores_data(self, endpoint_url, number_of_stores):
@@ -110,24 +127,32 @@ class DataExtractor():
                 number_of_stores(int): Number of stores from json response in list_number_of_stores method
         Returns:
                 df (pandas.DataFrame): Collated dataframe of details about every store
-                
+        Raises:
+                requests.HTTPError: If the data for any store could not be retrieved
+                ValueError: If no data was received for any store
         """        
         response_list = []    
+        failed_stores = []
         for i in range(number_of_stores):
-            response = requests.get(f'{endpoint_url}{i}', headers=self.api_header)
+            response = requests.get(f'{endpoint_url}{i}', headers=self.read_api_key())
             if response.status_code == 200:
                 response_list.append(response.json())
                 print(f"Collected data from store {i} of {number_of_stores}", end='\r')
             else:
                 print(f"Failed to retrieve data for store {i}. Status code: {response.status_code}")
+                failed_stores.append(i)
 
+        # Every store is still requested first so that all of the failures are shown, but a partial dataframe is never
+        # returned since the stage would then be recorded as completed and skipped when resuming
+        if failed_stores:
+            raise requests.HTTPError(f"Failed to retrieve data for {len(failed_stores)} of {number_of_stores} stores: {failed_stores}")
         if response_list:
             df = pd.DataFrame(response_list)
             print("Successfully created data frame of stores data from collated json responses")
             return df
         else:
             print("Failed to create dataframe, no data received")
-            return None
+            raise ValueError(f"No store data received from {endpoint_url}")
 
     def extract_from_s3(self, s3_address, file_name):
         """
@@ -149,6 +174,6 @@ class DataExtractor():
 
         except Exception as ex:
             print(f"Error downloading file from S3: {ex}")
-            return None
+            raise
 
 data_extractor = DataExtractor()
@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+
+class RunLedger():
+    """
+    This class is used to keep a record of every run of the data pipeline in a local SQLite file. Each
+    extract, clean and upload stage is recorded with its status, the artefact it produced, its row count and
+    how long it took, so that a failed run can be resumed from the stages that did not complete instead of
+    from the start.
+
+    Attributes:
+            ledger_file (str): Path of the SQLite file the ledger is stored in
+            connection (sqlite3.Connection): Connection to the ledger file, opened the first time it is needed
+            run_id (int): Id of the run currently being recorded
+            resume (bool): Whether stages completed in the current run should be skipped
+            ran_stages (set): Stages that have actually been run (not skipped) since the run was started or resumed
+    """
+    def __init__(self, ledger_file='pipeline_ledger.sqlite'):
+        self.ledger_file = ledger_file
+        self.connection = None
+        self.run_id = None
+        self.resume = False
+        self.ran_stages = set()
+
+    def connect(self):
+        """
+        This function is used to open the ledger file, creating its tables if needed, the first time the ledger
+        is used (so that importing this module doesn't create a ledger file). Ledger files created before stage
+        durations were recorded have the duration column added.
+
+        Returns:
+                connection (sqlite3.Connection): Connection to the ledger file
+        """
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.ledger_file)
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    status TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS stages (
+                    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    artefact TEXT,
+                    row_count INTEGER,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    error TEXT,
+                    duration REAL,
+                    PRIMARY KEY (run_id, stage)
+                );
+            """)
+            if 'duration' not in [column[1] for column in self.connection.execute("PRAGMA table_info(stages)")]:
+                with self.connection:
+                    self.connection.execute("ALTER TABLE stages ADD COLUMN duration REAL")
+        return self.connection
+
+    def now(self):
+        """
+        This function is used to timestamp runs and stages in the ledger.
+
+        Returns:
+                timestamp (str): Current local time in ISO format
+        """
+        return datetime.now().isoformat(timespec='seconds')
+
+    def start_run(self, resume=False):
+        """
+        This function is used to start recording a run. When resuming, the most recent run that did not
+        complete is carried on with, so the stages it already completed are skipped.
+
+        Args:
+                resume (bool): Whether to resume the most recent incomplete run
+        Returns:
+                run_id (int): Id of the run being recorded
+        """
+        self.resume = resume
+        self.ran_stages = set()
+        row = self.connect().execute("SELECT run_id, status FROM runs ORDER BY run_id DESC LIMIT 1").fetchone()
+        if resume and row is not None and row[1] != 'completed':
+            self.run_id = row[0]
+            with self.connect():
+                self.connect().execute("UPDATE runs SET status = 'running', finished_at = NULL WHERE run_id = ?", (self.run_id,))
+            print(f"Resuming pipeline run {self.run_id}")
+        else:
+            if resume:
+                print("No incomplete pipeline run to resume, starting a new run")
+                self.resume = False
+            with self.connect():
+                self.run_id = self.connect().execute("INSERT INTO runs (started_at, status) VALUES (?, 'running')", (self.now(),)).lastrowid
+            print(f"Starting pipeline run {self.run_id}")
+        return self.run_id
+
+    def finish_run(self, status):
+        """
+        This function is used to record the final status of the current run.
+
+        Args:
+                status (str): 'completed' or 'failed'
+        """
+        with self.connect():
+            self.connect().execute("UPDATE runs SET status = ?, finished_at = ? WHERE run_id = ?", (status, self.now(), self.run_id))
+
+    def stage_status(self, stage):
+        """
+        This function is used to get the status a stage was last recorded with in the current run.
+
+        Args:
+                stage (str): Name of the stage
+        Returns:
+                status (str): 'running', 'completed' or 'failed', or None if the stage hasn't been run
+        """
+        row = self.connect().execute("SELECT status FROM stages WHERE run_id = ? AND stage = ?", (self.run_id, stage)).fetchone()
+        return None if row is None else row[0]
+
+    def was_completed(self, stage):
+        """
+        This function is used to check whether a stage has completed at any point in the current run, even if it
+        has been started again since (its artefact is kept until it completes again).
+
+        Args:
+                stage (str): Name of the stage
+        Returns:
+                completed (bool): Whether the stage has completed in the current run
+        """
+        row = self.connect().execute("SELECT status, artefact FROM stages WHERE run_id = ? AND stage = ?", (self.run_id, stage)).fetchone()
+        return row is not None and (row[0] == 'completed' or row[1] is not None)
+
+    def is_completed(self, stage, depends_on=()):
+        """
+        This function is used to check whether a stage can be skipped when resuming, which is only the case if
+        it completed in the current run, the artefact it produced still exists and none of the stages it depends
+        on have had to be run again (since its output would then be out of date).
+
+        Args:
+                stage (str): Name of the stage
+                depends_on (tuple): Names of the stages whose output this stage uses
+        Returns:
+                completed (bool): Whether the stage can be skipped
+        """
+        if not self.resume or self.ran_stages.intersection(depends_on):
+            return False
+        row = self.connect().execute("SELECT artefact FROM stages WHERE run_id = ? AND stage = ? AND status = 'completed'",
+                                      (self.run_id, stage)).fetchone()
+        return row is not None and (row[0] is None or row[0].startswith('table:') or os.path.exists(row[0]))
+
+    def start_stage(self, stage):
+        """
+        This function is used to record that a stage of the current run has started. The artefact and row count
+        of an earlier completion of the stage are kept, see was_completed.
+
+        Args:
+                stage (str): Name of the stage
+        """
+        self.ran_stages.add(stage)
+        with self.connect():
+            self.connect().execute("""INSERT INTO stages (run_id, stage, status, started_at) VALUES (?, ?, 'running', ?)
+                                       ON CONFLICT (run_id, stage) DO UPDATE SET status = 'running', started_at = excluded.started_at,
+                                       finished_at = NULL, error = NULL""", (self.run_id, stage, self.now()))
+
+    def complete_stage(self, stage, artefact=None, row_count=None, duration=None):
+        """
+        This function is used to record that a stage of the current run has completed, along with its output.
+
+        Args:
+                stage (str): Name of the stage
+                artefact (str): File path of the output of the stage, or 'table:<name>' for an uploaded table
+                row_count (int): Number of rows produced by the stage
+                duration (float): Time taken by the stage in seconds
+        """
+        with self.connect():
+            self.connect().execute("UPDATE stages SET status = 'completed', artefact = ?, row_count = ?, duration = ?, finished_at = ? WHERE run_id = ? AND stage = ?",
+                                    (artefact, row_count, duration, self.now(), self.run_id, stage))
+
+    def fail_stage(self, stage, error):
+        """
+        This function is used to record that a stage of the current run has failed, along with the error.
+
+        Args:
+                stage (str): Name of the stage
+                error (Exception): The exception raised by the stage
+        """
+        with self.connect():
+            self.connect().execute("UPDATE stages SET status = 'failed', error = ?, finished_at = ? WHERE run_id = ? AND stage = ?",
+                                    (f"{type(error).__name__}: {error}", self.now(), self.run_id, stage))
+
+    def run_stage(self, stage, func, artefact=None, depends_on=()):
+        """
+        This function is used to run a single stage of the pipeline and record it in the ledger. The stage is
+        skipped if it was already completed in a run being resumed, and any exception it raises is recorded
+        and then raised again so the run stops at the failed stage.
+
+        Args:
+                stage (str): Name of the stage
+                func (function): Function which runs the stage and returns its row count (or None)
+                artefact (str): File path of the output of the stage
+                depends_on (tuple): Names of the stages whose output this stage uses
+        Returns:
+                row_count (int): Number of rows produced by the stage, or None if it was skipped
+        """
+        if self.is_completed(stage, depends_on):
+            print(f"Skipping {stage}, already completed in run {self.run_id}")
+            return None
+        self.start_stage(stage)
+        start = time.perf_counter()
+        try:
+            row_count = func()
+        except Exception as e:
+            self.fail_stage(stage, e)
+            print(f"Stage {stage} failed: {e}")
+            raise
+        self.complete_stage(stage, artefact, row_count, time.perf_counter() - start)
+        return row_count
+
+    def print_run(self, run_id=None):
+        """
+        This function is used to print a summary of each stage of a run, defaulting to the current one.
+
+        Args:
+                run_id (int): Id of the run to summarise
+        """
+        run_id = run_id or self.run_id
+        print(f"\nPipeline run {run_id}:")
+        for stage, status, row_count, duration, artefact, error in self.connect().execute(
+                "SELECT stage, status, row_count, duration, artefact, error FROM stages WHERE run_id = ? ORDER BY started_at, rowid", (run_id,)):
+            print(f"{stage:30s} {status:10s} {'' if row_count is None else row_count:>8} {'' if duration is None else f'{duration:.2f}s':>9} "
+                  f"{artefact or ''} {error or ''}")
+
+run_ledger = RunLedger()
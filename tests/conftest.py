@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+import uuid
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+# The modules being tested live in the root of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def postgres_url():
+    """
+    This fixture provides a postgresql server for the tests. A server can be given with the TEST_DATABASE_URL
+    environment variable (e.g. a local postgres container), otherwise a throwaway server is started with pgserver.
+    The tests are skipped if neither is available.
+    """
+    if os.environ.get('TEST_DATABASE_URL'):
+        yield make_url(os.environ['TEST_DATABASE_URL']).set(drivername='postgresql+psycopg2')
+        return
+    pgserver = pytest.importorskip('pgserver', reason="set TEST_DATABASE_URL or install pgserver to run the postgres tests")
+    with tempfile.TemporaryDirectory() as data_dir:
+        server = pgserver.get_server(data_dir, cleanup_mode='stop')
+        yield make_url(server.get_uri()).set(drivername='postgresql+psycopg2')
+        server.cleanup()
+
+@pytest.fixture
+def database_url(postgres_url):
+    """
+    This fixture creates an empty database for a single test and drops it afterwards.
+    """
+    database_name = f"test_{uuid.uuid4().hex}"
+    admin_engine = create_engine(postgres_url, isolation_level='AUTOCOMMIT')
+    with admin_engine.connect() as connection:
+        connection.execute(text(f'CREATE DATABASE "{database_name}"'))
+    yield postgres_url.set(database=database_name)
+    with admin_engine.connect() as connection:
+        connection.execute(text(f'DROP DATABASE "{database_name}" WITH (FORCE)'))
+    admin_engine.dispose()
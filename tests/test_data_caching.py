@@ -0,0 +1,129 @@
+import os
+import pandas as pd
+import pytest
+
+from data_caching import DataCache
+
+
+class Cleaner():
+    def __init__(self):
+        self.calls = 0
+
+    def clean_user_data(self, file):
+        self.calls += 1
+        return self.drop_invalid(pd.read_csv(file))
+
+    def clean_card_data(self, file):
+        self.calls += 1
+        return pd.read_csv(file)
+
+    def drop_invalid(self, df):
+        return df[df['value'] >= 0].reset_index(drop=True)
+
+class SameCleaner(Cleaner):
+    def __init__(self):
+        self.calls = 0
+
+    def clean_user_data(self, file):
+        self.calls += 1
+        return self.drop_invalid(pd.read_csv(file))
+
+class ChangedMethodCleaner(Cleaner):
+    def __init__(self):
+        self.calls = 0
+
+    def clean_user_data(self, file):
+        self.calls += 1
+        return self.drop_invalid(pd.read_csv(file)).drop_duplicates()
+
+class ChangedHelperCleaner(Cleaner):
+    def __init__(self):
+        self.calls = 0
+
+    def clean_user_data(self, file):
+        self.calls += 1
+        return self.drop_invalid(pd.read_csv(file))
+
+    def drop_invalid(self, df):
+        return df[df['value'] > 0].reset_index(drop=True)
+
+@pytest.fixture
+def cache(tmp_path):
+    return DataCache(str(tmp_path / 'cache'))
+
+def write_input(tmp_path, values, name='users.csv'):
+    file = tmp_path / name
+    pd.DataFrame({'value': values}).to_csv(file, index=False)
+    return str(file)
+
+def test_changing_the_input_file_changes_the_key(cache, tmp_path):
+    cleaner = Cleaner()
+    file = write_input(tmp_path, [1, 2, 3])
+    key = cache.make_key(cleaner.clean_user_data, file)
+    assert cache.make_key(cleaner.clean_user_data, file) == key
+    write_input(tmp_path, [1, 2, 4])
+    assert cache.make_key(cleaner.clean_user_data, file) != key
+
+def test_changing_the_method_source_changes_the_key(cache, tmp_path):
+    file = write_input(tmp_path, [1, 2, 3])
+    key = cache.make_key(Cleaner().clean_user_data, file)
+    assert cache.make_key(SameCleaner().clean_user_data, file) == key
+    assert cache.make_key(ChangedMethodCleaner().clean_user_data, file) != key
+
+def test_changing_a_called_method_changes_the_key(cache, tmp_path):
+    file = write_input(tmp_path, [1, 2, 3])
+    key = cache.make_key(Cleaner().clean_user_data, file)
+    assert cache.make_key(ChangedHelperCleaner().clean_user_data, file) != key
+    # clean_card_data doesn't call drop_invalid, so changing it doesn't affect its key
+    assert cache.make_key(ChangedHelperCleaner().clean_card_data, file) == cache.make_key(Cleaner().clean_card_data, file)
+
+def test_cache_hit_returns_the_cleaned_dataframe(cache, tmp_path):
+    cleaner = Cleaner()
+    file = write_input(tmp_path, [3, -1, 2])
+    cleaned_df = cache.load_or_clean(cleaner.clean_user_data, file)
+    cached_df = cache.load_or_clean(cleaner.clean_user_data, file)
+    assert cleaner.calls == 1
+    pd.testing.assert_frame_equal(cached_df, cleaned_df)
+
+def test_evict_removes_least_recently_used_entry_first(cache, tmp_path):
+    cleaner = Cleaner()
+    files = [write_input(tmp_path, [i], f'users_{i}.csv') for i in range(3)]
+    for file in files:
+        cache.load_or_clean(cleaner.clean_user_data, file)
+    paths = {file: os.path.join(cache.cache_dir, f"{cache.make_key(cleaner.clean_user_data, file)}.parquet") for file in files}
+    for last_used, file in enumerate(files):
+        os.utime(paths[file], (last_used, last_used))
+    cache.load_or_clean(cleaner.clean_user_data, files[0]) # A cache hit marks the oldest entry as recently used
+
+    cache.max_size_bytes = sum(size for _, size, _ in cache.list_entries()) - os.path.getsize(paths[files[1]])
+    cache.evict()
+    assert [path for path, _, _ in cache.list_entries()] == [paths[files[2]], paths[files[0]]]
+
+def test_invalidate_removes_only_that_methods_entries(cache, tmp_path):
+    cleaner = Cleaner()
+    file = write_input(tmp_path, [1, 2, 3])
+    cache.load_or_clean(cleaner.clean_user_data, file)
+    cache.load_or_clean(cleaner.clean_card_data, file)
+    assert cache.invalidate('clean_user_data') == 1
+    assert [os.path.basename(path).split('-')[0] for path, _, _ in cache.list_entries()] == ['clean_card_data']
+
+def test_damaged_entry_is_replaced(cache, tmp_path):
+    cleaner = Cleaner()
+    file = write_input(tmp_path, [1, 2, 3])
+    cleaned_df = cache.load_or_clean(cleaner.clean_user_data, file)
+    [(path, _, _)] = cache.list_entries()
+    with open(path, 'wb') as f:
+        f.write(b'not a parquet file')
+    pd.testing.assert_frame_equal(cache.load_or_clean(cleaner.clean_user_data, file), cleaned_df)
+    pd.testing.assert_frame_equal(cache.load_or_clean(cleaner.clean_user_data, file), cleaned_df)
+    assert cleaner.calls == 2
+
+def test_interrupted_write_leaves_no_entry(cache, tmp_path, monkeypatch):
+    def interrupted_to_parquet(self, path, **kwargs):
+        with open(path, 'wb') as f:
+            f.write(b'PAR1') # Partly written file
+        raise KeyboardInterrupt
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', interrupted_to_parquet)
+    with pytest.raises(KeyboardInterrupt):
+        cache.load_or_clean(Cleaner().clean_user_data, write_input(tmp_path, [1, 2, 3]))
+    assert os.listdir(cache.cache_dir) == []
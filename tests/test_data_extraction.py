@@ -0,0 +1,38 @@
+import pytest
+import requests
+
+from data_extraction import DataExtractor
+
+
+class FakeResponse():
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self.data = data
+
+    def json(self):
+        return self.data
+
+@pytest.fixture
+def extractor(monkeypatch):
+    """
+    This fixture provides a DataExtractor whose store API returns a store for every index except those in failing_stores.
+    """
+    data_extractor = DataExtractor()
+    data_extractor.api_header = {'x-api-key': 'test'}
+    data_extractor.failing_stores = set()
+    def get(url, headers=None):
+        store_number = int(url.rsplit('/', 1)[1])
+        if store_number in data_extractor.failing_stores:
+            return FakeResponse(500)
+        return FakeResponse(200, {'index': store_number, 'store_code': f'STORE-{store_number}'})
+    monkeypatch.setattr(requests, 'get', get)
+    return data_extractor
+
+def test_retrieve_stores_data_collects_every_store(extractor):
+    df = extractor.retrieve_stores_data('https://api.example.com/store_details/', 4)
+    assert df['index'].tolist() == [0, 1, 2, 3]
+
+def test_retrieve_stores_data_raises_when_any_store_fails(extractor):
+    extractor.failing_stores = {1, 3}
+    with pytest.raises(requests.HTTPError, match=r'2 of 4 stores: \[1, 3\]'):
+        extractor.retrieve_stores_data('https://api.example.com/store_details/', 4)
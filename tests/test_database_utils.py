@@ -0,0 +1,136 @@
+import threading
+import time
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from database_utils import DatabaseConnector
+
+
+@pytest.fixture
+def connector(database_url):
+    database_connector = DatabaseConnector()
+    database_connector.local_engine = create_engine(database_url, pool_size=6, max_overflow=0)
+    yield database_connector
+    database_connector.local_engine.dispose()
+
+def make_tables():
+    return {
+        'dim_users': pd.DataFrame({'user_uuid': ['u1', 'u2', 'u3']}),
+        'dim_card_details': pd.DataFrame({'card_number': ['1234', '5678']}),
+        'dim_store_details': pd.DataFrame({'store_code': ['WEB-1388012W']}),
+        'dim_products': pd.DataFrame({'product_code': ['A1-1', 'B2-2'], 'weight_kg': [1.5, 0.25]}),
+        'orders_table': pd.DataFrame({'user_uuid': ['u1', 'u3'], 'product_quantity': [1, 4]}),
+        'dim_date_times': pd.DataFrame({'timestamp': ['22:00:06']}),
+    }
+
+def count_rows(engine, table_name):
+    with engine.connect() as connection:
+        return connection.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+
+def record_uploads(monkeypatch, connector, delay=0.2):
+    """
+    Wraps upload_to_db so that each upload is slowed down slightly and its start and end times are recorded,
+    along with the largest number of uploads running at the same time.
+    """
+    upload_to_db = connector.upload_to_db
+    lock = threading.Lock()
+    record = {'running': 0, 'max_running': 0, 'times': {}}
+    def recording_upload_to_db(df, table_name, if_exists='fail'):
+        with lock:
+            record['running'] += 1
+            record['max_running'] = max(record['max_running'], record['running'])
+        start = time.perf_counter()
+        try:
+            time.sleep(delay)
+            return upload_to_db(df, table_name, if_exists)
+        finally:
+            with lock:
+                record['running'] -= 1
+                record['times'][table_name] = (start, time.perf_counter())
+    monkeypatch.setattr(connector, 'upload_to_db', recording_upload_to_db)
+    return record
+
+def test_upload_tables_uploads_every_table_and_returns_timings(connector):
+    tables = make_tables()
+    timings = connector.upload_tables(tables)
+    assert set(timings) == set(tables)
+    assert all(isinstance(elapsed, float) and elapsed > 0 for elapsed in timings.values())
+    for table_name, df in tables.items():
+        assert count_rows(connector.local_engine, table_name) == len(df)
+
+def test_upload_tables_uploads_concurrently(connector, monkeypatch):
+    record = record_uploads(monkeypatch, connector)
+    tables = make_tables()
+    connector.upload_tables(tables, max_workers=len(tables))
+    assert record['max_running'] == len(tables)
+
+def test_failed_table_is_rolled_back_while_others_are_committed(connector):
+    tables = make_tables()
+    # psycopg2 can't adapt the last value, so the insert fails after the table has been created in the transaction
+    tables['dim_products'] = pd.DataFrame({'product_code': ['A1-1', object()]})
+    uploaded = []
+    with pytest.raises(RuntimeError, match='dim_products'):
+        connector.upload_tables(tables, on_uploaded=lambda table_name, elapsed: uploaded.append(table_name))
+    table_names = inspect(connector.local_engine).get_table_names()
+    assert 'dim_products' not in table_names
+    assert set(uploaded) == set(tables) - {'dim_products'}
+    assert set(uploaded) <= set(table_names)
+
+def test_failed_append_leaves_existing_rows_untouched(connector):
+    with connector.local_engine.begin() as connection:
+        connection.execute(text('CREATE TABLE dim_users (user_uuid TEXT NOT NULL)'))
+        connection.execute(text("INSERT INTO dim_users VALUES ('existing')"))
+    # The first row is inserted before the null violates the constraint, so it has to be rolled back
+    with pytest.raises(RuntimeError):
+        connector.upload_tables({'dim_users': pd.DataFrame({'user_uuid': ['new', None]})}, if_exists='append')
+    with connector.local_engine.connect() as connection:
+        assert connection.execute(text('SELECT user_uuid FROM dim_users')).scalars().all() == ['existing']
+
+def test_if_exists_replace_replaces_existing_table(connector):
+    connector.upload_tables({'dim_users': pd.DataFrame({'user_uuid': ['u1', 'u2']})})
+    connector.upload_tables({'dim_users': pd.DataFrame({'user_uuid': ['u3']}),
+                             'dim_card_details': pd.DataFrame({'card_number': ['1234']})},
+                            if_exists={'dim_users': 'replace'})
+    assert count_rows(connector.local_engine, 'dim_users') == 1
+    assert count_rows(connector.local_engine, 'dim_card_details') == 1
+
+def create_tables_with_foreign_keys(engine):
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE dim_users ("index" BIGINT, user_uuid TEXT PRIMARY KEY)'))
+        connection.execute(text('CREATE TABLE dim_products ("index" BIGINT, product_code TEXT PRIMARY KEY)'))
+        connection.execute(text('CREATE TABLE orders_table ("index" BIGINT, user_uuid TEXT REFERENCES dim_users (user_uuid), '
+                                'product_code TEXT REFERENCES dim_products (product_code))'))
+
+def test_enforce_fk_order_uploads_dimension_tables_before_fact_tables(connector, monkeypatch):
+    create_tables_with_foreign_keys(connector.local_engine)
+    record = record_uploads(monkeypatch, connector)
+    tables = {
+        'orders_table': pd.DataFrame({'user_uuid': ['u1', 'u2'], 'product_code': ['A1-1', 'A1-1']}),
+        'dim_users': pd.DataFrame({'user_uuid': ['u1', 'u2']}),
+        'dim_products': pd.DataFrame({'product_code': ['A1-1']}),
+    }
+    timings = connector.upload_tables(tables, enforce_fk_order=True, if_exists='append')
+    assert set(timings) == set(tables)
+    orders_start = record['times']['orders_table'][0]
+    assert all(record['times'][table_name][1] <= orders_start for table_name in ('dim_users', 'dim_products'))
+    assert count_rows(connector.local_engine, 'orders_table') == 2
+
+def test_enforce_fk_order_skips_fact_tables_when_a_dimension_table_fails(connector, monkeypatch):
+    create_tables_with_foreign_keys(connector.local_engine)
+    record = record_uploads(monkeypatch, connector, delay=0)
+    tables = {
+        'dim_users': pd.DataFrame({'user_uuid': ['u1', 'u1']}), # Duplicate primary key
+        'dim_products': pd.DataFrame({'product_code': ['A1-1']}),
+        'orders_table': pd.DataFrame({'user_uuid': ['u1'], 'product_code': ['A1-1']}),
+    }
+    with pytest.raises(RuntimeError, match='dim_users'):
+        connector.upload_tables(tables, enforce_fk_order=True, if_exists='append')
+    assert 'orders_table' not in record['times']
+    assert count_rows(connector.local_engine, 'dim_users') == 0
+    assert count_rows(connector.local_engine, 'dim_products') == 1
+
+def test_upload_tables_resizes_smaller_pool(connector):
+    connector.local_engine = create_engine(connector.local_engine.url, pool_size=2, max_overflow=0)
+    connector.upload_tables(make_tables(), max_workers=8)
+    assert connector.local_engine.pool.size() == 8
@@ -0,0 +1,109 @@
+import importlib.util
+import os
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from run_ledger import RunLedger
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch, database_url):
+    """
+    This fixture imports __main__.py as a module, working in a temporary directory with its own run ledger and
+    uploading to an empty test database.
+    """
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location('pipeline', os.path.join(ROOT_DIR, '__main__.py'))
+    pipeline = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(pipeline)
+    monkeypatch.setattr(pipeline, 'run_ledger', RunLedger(str(tmp_path / 'pipeline_ledger.sqlite')))
+    monkeypatch.setattr(pipeline.database_connector, 'local_engine', create_engine(database_url, pool_size=6, max_overflow=0))
+
+    os.makedirs('cleaned_data')
+    for table_name, _, _, _ in pipeline.cleaning_stages:
+        pd.DataFrame({'value': range(3)}).to_pickle(pipeline.cleaned_data_path(table_name))
+    yield pipeline
+    pipeline.database_connector.local_engine.dispose()
+
+def record_uploaded_tables(monkeypatch, pipeline):
+    uploaded_tables = []
+    upload_to_db = pipeline.database_connector.upload_to_db
+    def recording_upload_to_db(df, table_name, if_exists='fail'):
+        uploaded_tables.append((table_name, if_exists))
+        return upload_to_db(df, table_name, if_exists)
+    monkeypatch.setattr(pipeline.database_connector, 'upload_to_db', recording_upload_to_db)
+    return uploaded_tables
+
+def upload_statuses(pipeline):
+    return dict(pipeline.run_ledger.connect().execute("SELECT stage, status FROM stages WHERE stage LIKE 'upload_%'").fetchall())
+
+def test_partial_upload_failure_is_recorded_and_resumed(pipeline, monkeypatch):
+    engine = pipeline.database_connector.local_engine
+    with engine.begin() as connection: # A table the pipeline didn't create makes the dim_products upload fail
+        connection.execute(text('CREATE TABLE dim_products (other INTEGER)'))
+
+    pipeline.run_ledger.start_run()
+    with pytest.raises(RuntimeError, match='dim_products'):
+        pipeline.upload_datasets()
+    pipeline.run_ledger.finish_run('failed')
+    statuses = upload_statuses(pipeline)
+    assert statuses.pop('upload_dim_products') == 'failed'
+    assert set(statuses.values()) == {'completed'}
+    assert len(statuses) == len(pipeline.cleaning_stages) - 1
+
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE dim_products'))
+    uploaded_tables = record_uploaded_tables(monkeypatch, pipeline)
+    pipeline.run_ledger.start_run(resume=True)
+    pipeline.upload_datasets()
+    assert uploaded_tables == [('dim_products', 'fail')]
+    assert set(upload_statuses(pipeline).values()) == {'completed'}
+
+def test_uploaded_table_is_replaced_when_upstream_stage_runs_again(pipeline, monkeypatch):
+    engine = pipeline.database_connector.local_engine
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE dim_products (other INTEGER)'))
+    pipeline.run_ledger.start_run()
+    with pytest.raises(RuntimeError):
+        pipeline.upload_datasets()
+    pipeline.run_ledger.finish_run('failed')
+
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE dim_products'))
+    uploaded_tables = record_uploaded_tables(monkeypatch, pipeline)
+    pipeline.run_ledger.start_run(resume=True)
+    # Cleaning dim_users again (e.g. because its extracted file was missing) invalidates its completed upload
+    pd.DataFrame({'value': range(5)}).to_pickle(pipeline.cleaned_data_path('dim_users'))
+    pipeline.run_ledger.run_stage('clean_dim_users', lambda: 5, artefact=pipeline.cleaned_data_path('dim_users'))
+    pipeline.upload_datasets()
+
+    assert sorted(uploaded_tables) == [('dim_products', 'fail'), ('dim_users', 'replace')]
+    with engine.connect() as connection:
+        assert connection.execute(text('SELECT COUNT(*) FROM dim_users')).scalar() == 5
+    assert set(upload_statuses(pipeline).values()) == {'completed'}
+    assert 'dim_products' in inspect(engine).get_table_names()
+
+def test_s3_extract_stages_record_row_counts(pipeline, monkeypatch):
+    downloads = {
+        'extracted_data/product_details.csv': pd.DataFrame({'product_code': ['A1-1', 'B2-2', 'C3-3']}).to_csv(index=False),
+        'extracted_data/event_details.json': pd.DataFrame({'timestamp': ['22:00:06', '09:31:45']}).to_json(),
+    }
+    def extract_from_s3(s3_address, file_name):
+        with open(file_name, 'w') as file:
+            file.write(downloads[file_name])
+    monkeypatch.setattr(pipeline.data_extractor, 'extract_from_s3', extract_from_s3)
+    os.makedirs('extracted_data')
+
+    pipeline.run_ledger.start_run()
+    assert pipeline.run_ledger.run_stage('extract_product_data', pipeline.extract_product_data) == 3
+    assert pipeline.run_ledger.run_stage('extract_events_data', pipeline.extract_events_data) == 2
+
+def test_upload_timings_are_returned_and_recorded(pipeline):
+    pipeline.run_ledger.start_run()
+    timings = pipeline.upload_datasets()
+    assert set(timings) == {table_name for table_name, _, _, _ in pipeline.cleaning_stages}
+    durations = dict(pipeline.run_ledger.connect().execute("SELECT stage, duration FROM stages WHERE stage LIKE 'upload_%'").fetchall())
+    assert durations == {f'upload_{table_name}': elapsed for table_name, elapsed in timings.items()}
@@ -0,0 +1,148 @@
+import sqlite3
+import time
+import pytest
+
+from run_ledger import RunLedger
+
+
+@pytest.fixture
+def ledger_file(tmp_path):
+    return str(tmp_path / 'pipeline_ledger.sqlite')
+
+def stage_row(ledger, stage):
+    return ledger.connect().execute("SELECT status, artefact, row_count, error FROM stages WHERE run_id = ? AND stage = ?",
+                                     (ledger.run_id, stage)).fetchone()
+
+def failing_stage():
+    raise ValueError("source unavailable")
+
+def test_run_stage_records_completed_stage(ledger_file, tmp_path):
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    artefact = tmp_path / 'users.csv'
+    artefact.write_text('data')
+    assert ledger.run_stage('extract_user_data', lambda: 10, artefact=str(artefact)) == 10
+    assert stage_row(ledger, 'extract_user_data') == ('completed', str(artefact), 10, None)
+
+def test_run_stage_records_failure_and_raises(ledger_file):
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    with pytest.raises(ValueError):
+        ledger.run_stage('extract_card_data', failing_stage)
+    assert stage_row(ledger, 'extract_card_data') == ('failed', None, None, "ValueError: source unavailable")
+
+def test_stages_are_not_skipped_without_resume(ledger_file):
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.run_stage('extract_product_data', lambda: None)
+    assert not ledger.is_completed('extract_product_data')
+
+def test_start_run_resumes_latest_failed_run(ledger_file):
+    ledger = RunLedger(ledger_file)
+    run_id = ledger.start_run()
+    ledger.finish_run('failed')
+    resumed_ledger = RunLedger(ledger_file)
+    assert resumed_ledger.start_run(resume=True) == run_id
+    assert resumed_ledger.resume
+
+def test_start_run_with_resume_starts_new_run_after_completed_run(ledger_file):
+    ledger = RunLedger(ledger_file)
+    run_id = ledger.start_run()
+    ledger.finish_run('completed')
+    resumed_ledger = RunLedger(ledger_file)
+    assert resumed_ledger.start_run(resume=True) == run_id + 1
+    assert not resumed_ledger.resume
+
+def test_start_run_with_resume_and_no_runs_starts_new_run(ledger_file):
+    ledger = RunLedger(ledger_file)
+    assert ledger.start_run(resume=True) == 1
+    assert not ledger.resume
+
+def test_resumed_run_skips_completed_stages_only(ledger_file, tmp_path):
+    artefact = tmp_path / 'users.csv'
+    artefact.write_text('data')
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.run_stage('extract_user_data', lambda: 10, artefact=str(artefact))
+    with pytest.raises(ValueError):
+        ledger.run_stage('extract_card_data', failing_stage)
+    ledger.finish_run('failed')
+
+    calls = []
+    resumed_ledger = RunLedger(ledger_file)
+    resumed_ledger.start_run(resume=True)
+    assert resumed_ledger.run_stage('extract_user_data', lambda: calls.append('users'), artefact=str(artefact)) is None
+    assert resumed_ledger.run_stage('extract_card_data', lambda: calls.append('cards') or 5) == 5
+    assert calls == ['cards']
+    assert stage_row(resumed_ledger, 'extract_card_data')[0] == 'completed'
+
+def test_completed_stage_with_missing_artefact_is_run_again(ledger_file, tmp_path):
+    artefact = tmp_path / 'users.csv'
+    artefact.write_text('data')
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.run_stage('extract_user_data', lambda: 10, artefact=str(artefact))
+    ledger.finish_run('failed')
+    artefact.unlink()
+    resumed_ledger = RunLedger(ledger_file)
+    resumed_ledger.start_run(resume=True)
+    assert not resumed_ledger.is_completed('extract_user_data')
+
+def test_uploaded_table_artefact_counts_as_existing(ledger_file):
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.start_stage('upload_dim_users')
+    ledger.complete_stage('upload_dim_users', 'table:dim_users', 3)
+    ledger.finish_run('failed')
+    resumed_ledger = RunLedger(ledger_file)
+    resumed_ledger.start_run(resume=True)
+    assert resumed_ledger.is_completed('upload_dim_users', depends_on=('clean_dim_users',))
+
+def test_stage_is_run_again_when_a_dependency_was_run_again(ledger_file, tmp_path):
+    extracted, cleaned = tmp_path / 'users.csv', tmp_path / 'dim_users.pkl'
+    extracted.write_text('data')
+    cleaned.write_text('data')
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.run_stage('extract_user_data', lambda: 10, artefact=str(extracted))
+    ledger.run_stage('clean_dim_users', lambda: 9, artefact=str(cleaned), depends_on=('extract_user_data',))
+    ledger.finish_run('failed')
+    extracted.unlink()
+
+    resumed_ledger = RunLedger(ledger_file)
+    resumed_ledger.start_run(resume=True)
+    assert resumed_ledger.is_completed('clean_dim_users', depends_on=('extract_user_data',))
+    resumed_ledger.run_stage('extract_user_data', lambda: extracted.write_text('new data') and 11, artefact=str(extracted))
+    assert not resumed_ledger.is_completed('clean_dim_users', depends_on=('extract_user_data',))
+
+def test_was_completed_is_kept_when_stage_fails_after_completing(ledger_file):
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.start_stage('upload_dim_users')
+    ledger.complete_stage('upload_dim_users', 'table:dim_users', 3)
+    ledger.start_stage('upload_dim_users')
+    ledger.fail_stage('upload_dim_users', RuntimeError("upload failed"))
+    assert ledger.stage_status('upload_dim_users') == 'failed'
+    assert ledger.was_completed('upload_dim_users')
+    assert not ledger.was_completed('upload_dim_products')
+
+def test_run_stage_records_duration(ledger_file):
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.run_stage('extract_user_data', lambda: time.sleep(0.05))
+    [duration] = ledger.connect().execute("SELECT duration FROM stages WHERE stage = 'extract_user_data'").fetchone()
+    assert 0.05 <= duration < 5
+
+def test_duration_column_is_added_to_older_ledger(ledger_file):
+    with sqlite3.connect(ledger_file) as connection:
+        connection.executescript("""
+            CREATE TABLE runs (run_id INTEGER PRIMARY KEY AUTOINCREMENT, started_at TEXT NOT NULL, finished_at TEXT, status TEXT NOT NULL);
+            CREATE TABLE stages (run_id INTEGER NOT NULL REFERENCES runs (run_id), stage TEXT NOT NULL, status TEXT NOT NULL, artefact TEXT,
+                                 row_count INTEGER, started_at TEXT NOT NULL, finished_at TEXT, error TEXT, PRIMARY KEY (run_id, stage));
+        """)
+    connection.close()
+    ledger = RunLedger(ledger_file)
+    ledger.start_run()
+    ledger.start_stage('upload_dim_users')
+    ledger.complete_stage('upload_dim_users', 'table:dim_users', 3, 1.5)
+    assert ledger.connect().execute("SELECT duration FROM stages WHERE stage = 'upload_dim_users'").fetchone() == (1.5,)